@@ -1,18 +1,83 @@
+import asyncio
 import socket
-import os
 import json
-import time
+import math
+import struct
 import threading
 import logging
-import traceback
+import queue
+
+try:
+    import orjson
+except ImportError:
+    # Maya's bundled Python doesn't ship orjson, fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is only bundled with recent Maya versions
+    np = None
 
 from maya import cmds as cmds
+from maya.api import OpenMaya as om
 import maya.utils
 
-logging.basicConfig(level=logging.INFO, 
+logging.basicConfig(level=logging.WARNING, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("MayaMCPServer2")
 
+SOCKET_BUFFER_SIZE = 256 * 1024
+# Largest command or response frame either side will accept
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+# Number of objects listed in detail by get_scene_info
+MAX_SCENE_OBJECTS = 10
+
+# Maya constructors for each object type accepted by create_object
+_SHAPE_CTORS = {
+    "CUBE": cmds.polyCube,
+    "SPHERE": cmds.polySphere,
+    "CYLINDER": cmds.polyCylinder,
+    "PLANE": cmds.polyPlane,
+    "CONE": cmds.polyCone,
+    "TORUS": cmds.polyTorus,
+}
+
+# create_object params forwarded to cmds.polyTorus
+_TORUS_FLAGS = {
+    "major_segments": "sx",
+    "minor_segments": "sy",
+    "major_radius": "r",
+    "minor_radius": "sr",
+}
+
+
+def _json_dumps(obj):
+    """Serialize obj to UTF-8 encoded JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def _json_loads(data):
+    """Deserialize UTF-8 encoded JSON from a bytes-like object"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(str(data, 'utf-8'))
+
+
+def _set_future_result(future, result):
+    # The client may have disconnected while Maya was running the command
+    if not future.done():
+        future.set_result(result)
+
+
+def _round_locations(positions):
+    """Round a sequence of [x, y, z] positions to 2 decimals"""
+    if np is not None:
+        return np.round(np.asarray(positions, dtype=float), 2).tolist()
+    return [[round(v, 2) for v in position] for position in positions]
+
 
 class MayaMCPServer:
     def __init__(self, host='localhost', port=9876):
@@ -22,10 +87,24 @@ class MayaMCPServer:
         self.running = False
         self.socket = None
         self.server_thread = None
+        self._loop = None
+        self._maya_queue = None
+        self._maya_thread = None
+        self._scene_cache = None
+        self._callback_ids = []
+
+        # Base handlers that are always available
+        self._handlers = {
+            "about": self.about,
+            "get_scene_info": self.get_scene_info,
+            "create_object": self.create_object,
+            "modify_object": self.modify_object,
+            "delete_object": self.delete_object,
+        }
 
     def start(self):
         if self.running:
-            print("Server is already running")
+            logger.warning("Server is already running")
             return
         
         self.running = True
@@ -34,28 +113,38 @@ class MayaMCPServer:
             # Create socket
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # Accepted sockets inherit these buffer sizes, large enough for a scene_info response
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
             self.socket.bind((self.host, self.port))
-            self.socket.listen(1)
+            self.socket.listen(socket.SOMAXCONN)
+            self.socket.setblocking(False)
+
+            # The event loop thread only does socket I/O and JSON work; parsed commands are
+            # queued to a single consumer that hands them to Maya's main thread
+            self._loop = asyncio.new_event_loop()
+            self._maya_queue = queue.Queue()
+            self._maya_thread = threading.Thread(target=self._maya_loop)
+            self._maya_thread.daemon = True
+            self._maya_thread.start()
+
+            self._register_scene_callbacks()
 
             # Start server thread
             self.server_thread = threading.Thread(target=self._server_loop)
             self.server_thread.daemon = True
             self.server_thread.start()
 
-            print(f"Server is running on {self.host}:{self.port}")
+            logger.info("Server is running on %s:%s", self.host, self.port)
         except Exception as e:
-            print(f"Error starting server: {e}")
+            logger.error("Error starting server: %s", e)
             self.stop()
 
     def stop(self):
         self.running = False
-        # Close socket
-        if self.socket:
-            try:
-                self.socket.close()
-            except Exception as e:
-                print(f"Error closing socket: {e}")
-            self.socket = None
+        # Stop event loop
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
         
         # Wait for thread to finish
         if self.server_thread:
@@ -63,115 +152,170 @@ class MayaMCPServer:
                 if self.server_thread.is_alive():
                     self.server_thread.join(timeout=1.0)
             except Exception as e:
-                print(f"Error joining server thread: {e}")
+                logger.error("Error joining server thread: %s", e)
             self.server_thread = None
+        self._loop = None
+
+        # Close socket
+        if self.socket:
+            try:
+                self.socket.close()
+            except Exception as e:
+                logger.error("Error closing socket: %s", e)
+            self.socket = None
+
+        # Stop the Maya command consumer
+        if self._maya_thread:
+            self._maya_queue.put(None)
+            try:
+                if self._maya_thread.is_alive():
+                    self._maya_thread.join(timeout=1.0)
+            except Exception as e:
+                logger.error("Error joining Maya command thread: %s", e)
+            self._maya_thread = None
+            self._maya_queue = None
+
+        if self._callback_ids:
+            om.MMessage.removeCallbacks(self._callback_ids)
+            self._callback_ids = []
+            self._scene_cache = None
         
-        print("Maya MCPServer stopped")
+        logger.info("Maya MCPServer stopped")
 
     def _server_loop(self):
         """
-        Main server loop in a separate thread
+        Run the asyncio event loop serving all clients in a separate thread
         """
-        while self.running:
-            try:
-                print("Waiting for connection...")
-                # Accept new connection
-                try:
-                    client, address = self.socket.accept()
-                    print(f"Connected to client: {address}")
-                    
-                    # Handle client in a separate thread
-                    client_thread = threading.Thread(
-                        target=self._handle_client,
-                        args=(client,)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
-                except socket.timeout:
-                    # Just check running condition
-                    print("Timeout while waiting for connection")
-                    continue
-                except Exception as e:
-                    print(f"Error accepting connection: {str(e)}")
-                    time.sleep(0.5)
-            except Exception as e:
-                print(f"Error in server loop: {str(e)}")
-                if not self.running:
-                    break
-                time.sleep(0.5)
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        server = None
+        try:
+            server = loop.run_until_complete(
+                asyncio.start_server(self._handle_client, sock=self.socket)
+            )
+            logger.info("Waiting for connection...")
+            loop.run_forever()
+        except Exception as e:
+            logger.error("Error in server loop: %s", e)
+        finally:
+            if server:
+                server.close()
+            # Cancel client handlers still waiting on their sockets
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
         
-        print("Server thread stopped")
+        logger.info("Server thread stopped")
 
-    def _handle_client(self, client):
-        print("Handling client...")
-        client.settimeout(None)
-        buffer = b''
+    def _maya_loop(self):
+        """
+        Consume queued commands and schedule them on Maya's main thread
+        """
+        while True:
+            item = self._maya_queue.get()
+            if item is None:
+                break
+            command, future = item
+            maya.utils.executeDeferred(self._dispatch, command, future)
+
+        logger.info("Maya command thread stopped")
+
+    def _dispatch(self, command, future):
+        """
+        Execute a command in Maya's main thread and hand the response back to the event loop
+        """
+        try:
+            response = self.execute_command(command)
+        except Exception as e:
+            logger.exception("Error executing command: %s", e)
+            response = {
+                "status": "error",
+                "message": str(e)
+            }
+        try:
+            future.get_loop().call_soon_threadsafe(_set_future_result, future, response)
+        except RuntimeError:
+            logger.warning("Failed to send response - server stopped")
+
+    def _write_frame(self, writer, data):
+        # writelines hands header and payload to the transport without joining them
+        writer.writelines((struct.pack(">I", len(data)), data))
+
+    async def _handle_client(self, reader, writer):
+        logger.debug("Connected to client: %s", writer.get_extra_info('peername'))
+        # Responses are small, send them immediately instead of waiting on Nagle's algorithm
+        client = writer.get_extra_info('socket')
+        if client is not None:
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
 
         try:
             while self.running:
-                # Receive data
+                # Every command is framed as a 4-byte big-endian length followed by the JSON payload
                 try:
-                    data = client.recv(8192)
-                    if not data:
-                        print("Client disconnected")
+                    header = await reader.readexactly(4)
+                    length = struct.unpack(">I", header)[0]
+                    if length > MAX_FRAME_SIZE:
+                        # A bad header means the stream is out of sync, so reply once and drop the client
+                        logger.error("Command frame of %d bytes exceeds the %d byte limit", length, MAX_FRAME_SIZE)
+                        self._write_frame(writer, _json_dumps({
+                            "status": "error",
+                            "message": f"Command frame exceeds {MAX_FRAME_SIZE} bytes"
+                        }))
+                        await writer.drain()
                         break
-                    
-                    buffer += data
-                    try:
-                        # Try to parse command
-                        command = json.loads(buffer.decode('utf-8'))
-                        buffer = b''
-                        
-                        # Execute command in Blender's main thread
-                        def execute_wrapper():
-                            print("Executing command:", command)
-                            try:
-                                response = self.execute_command(command)
-                                print("response:", response)
-                                response_json = json.dumps(response)
-                                print("response_json:", response_json)
-                                try:
-                                    client.sendall(response_json.encode('utf-8'))
-                                except:
-                                    print("Failed to send response - client disconnected")
-                            except Exception as e:
-                                print(f"Error executing command: {str(e)}")
-                                traceback.print_exc()
-                                try:
-                                    error_response = {
-                                        "status": "error",
-                                        "message": str(e)
-                                    }
-                                    client.sendall(json.dumps(error_response).encode('utf-8'))
-                                except:
-                                    pass
-                            return None
-                        
-                        # Schedule execution in main thread
-                        maya.utils.executeDeferred(execute_wrapper)
-                        print("Executing command...")
-                    except json.JSONDecodeError:
-                        # Incomplete data, wait for more
-                        print("Incomplete data, waiting for more...")
-                        pass
-                except Exception as e:
-                    print(f"Error receiving data: {str(e)}")
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    logger.debug("Client disconnected")
                     break
+
+                try:
+                    command = _json_loads(payload)
+                except ValueError as e:
+                    # The frame was complete, so the stream is still in sync; report and keep reading
+                    logger.error("Invalid command payload: %s", e)
+                    self._write_frame(writer, _json_dumps({
+                        "status": "error",
+                        "message": f"Invalid JSON command: {e}"
+                    }))
+                    await writer.drain()
+                    continue
+
+                future = self._loop.create_future()
+                self._maya_queue.put((command, future))
+                response = await future
+
+                data = _json_dumps(response)
+                if len(data) > MAX_FRAME_SIZE:
+                    logger.error("Response of %d bytes exceeds the %d byte limit", len(data), MAX_FRAME_SIZE)
+                    data = _json_dumps({
+                        "status": "error",
+                        "message": f"Response exceeds {MAX_FRAME_SIZE} bytes"
+                    })
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("response=%r", data)
+                self._write_frame(writer, data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            logger.debug("Client connection closed")
         except Exception as e:
-            print(f"Error in client handler: {str(e)}")
+            logger.error("Error in client handler: %s", e)
         finally:
             try:
-                client.close()
+                writer.close()
             except:
                 pass
-            print("Client handler stopped")
+            logger.debug("Client handler stopped")
             
     def execute_command(self, command):
         """Execute a command in the main Maya thread"""
         try:
             cmd_type = command.get("command")
             params = command.get("params", {})
-            print(f"Executing command: {cmd_type} with params: {params}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Executing command: %s with params: %r", cmd_type, params)
             if cmd_type in ["create_object", "modify_object", "delete_object"]:
                 # Run in the main thread to be safe with UI/scene changes
                 return maya.utils.executeInMainThreadWithResult(self._execute_command_internal, command)
@@ -179,111 +323,180 @@ class MayaMCPServer:
                 return self._execute_command_internal(command)
 
         except Exception as e:
-            print(f"Error executing command: {str(e)}")
-            traceback.print_exc()
+            logger.exception("Error executing command: %s", e)
             return {"status": "error", "message": str(e)}
 
     def _execute_command_internal(self, command):
         cmd_type = command.get("command")
         params = command.get("params", {})
         
-        # Base handlers that are always available
-        handlers = {
-            "get_scene_info": self.get_scene_info,
-            "create_object": self.create_object
-        }
-        
-        handler = handlers.get(cmd_type)
+        handler = self._handlers.get(cmd_type)
         if handler:
             result = handler(params)
             return {"status": "success", "result": result}
-        
+        return {"status": "error", "message": f"Unknown command type: {cmd_type}"}
+
+    def about(self, params=None):
+        """Get the version of the running Maya"""
+        return {
+            "version": cmds.about(version=True),
+            "api_version": cmds.about(apiVersion=True),
+        }
+
     def create_object(self, params=None):
-        name = params.get("type", "pCube1")
+        obj_type = params.get("type", "CUBE").upper()
+        ctor = _SHAPE_CTORS.get(obj_type)
+        if ctor is None:
+            raise ValueError(f"Unsupported object type: {obj_type}")
+
         location = params.get("location", (0, 0, 0))
-        rotaion = params.get("rotation", (0, 0, 0))
+        rotation = params.get("rotation", (0, 0, 0))
         scale = params.get("scale", (1, 1, 1))
-        cube = cmds.polyCube(name=name)[0]
-        cmds.xform(cube, ws=True, t=location)
-        cmds.xform(cube, ws=True, ro=rotaion)
-        cmds.xform(cube, ws=True, s=scale)
+
+        ctor_kwargs = {}
+        if params.get("name"):
+            ctor_kwargs["name"] = params["name"]
+        if obj_type == "TORUS":
+            for param, flag in _TORUS_FLAGS.items():
+                if param in params:
+                    ctor_kwargs[flag] = params[param]
+
+        obj = ctor(**ctor_kwargs)[0]
+        cmds.xform(obj, ws=True, t=location, ro=rotation, s=scale)
         
         result = {
-                "name": name,
+                "name": obj,
                 "location": location
             }
         return result
     
     def modify_object(self, params=None):
         name = params.get("name")
-        obj = cmds.ls(name)
+        matches = cmds.ls(name)
+        if not matches:
+            raise ValueError(f"Object not found: {name}")
+        obj = matches[0]
         
         location = params.get("location")
         rotation = params.get("rotation")
         scale = params.get("scale")
-        visibility = params.get("visibility", True)
+        visibility = params.get("visibility")
         
+        # Apply all requested transforms in a single xform call
+        xform_kwargs = {}
         if location is not None:
-            cmds.xform(obj, ws=True, t=location)
+            xform_kwargs["t"] = location
         if rotation is not None:
-            cmds.xform(obj, ws=True, ro=rotation)
+            xform_kwargs["ro"] = rotation
         if scale is not None:
-            cmds.xform(obj, ws=True, s=scale)
+            xform_kwargs["s"] = scale
+        if xform_kwargs:
+            cmds.xform(obj, ws=True, **xform_kwargs)
         if visibility is not None:
-            cmds.setAttr(f"{obj[0]}.visibility", visibility)
+            cmds.setAttr(f"{obj}.visibility", visibility)
+
+        # Decompose the world matrix once instead of querying each attribute
+        sel = om.MSelectionList()
+        sel.add(obj)
+        path = sel.getDagPath(0)
+        fn = om.MFnTransform(path)
+        world = om.MTransformationMatrix(path.inclusiveMatrix())
+        # Report the rotation in the object's own rotate order, as cmds.xform does
+        world.reorderRotation(fn.rotationOrder())
+        euler = world.rotation()
         result = {
             "name": name,
-            "location": cmds.xform(obj, q=True, ws=True, t=True),
-            "rotation": cmds.xform(obj, q=True, ws=True, ro=True),
-            "scale": cmds.xform(obj, q=True, ws=True, s=True),
-            "visibility": cmds.getAttr(f"{obj[0]}.visibility")
+            "location": list(world.translation(om.MSpace.kWorld)),
+            "rotation": [math.degrees(euler.x), math.degrees(euler.y), math.degrees(euler.z)],
+            "scale": world.scale(om.MSpace.kWorld),
+            "visibility": fn.findPlug("visibility", False).asBool()
         }
         
         return result
+
+    def delete_object(self, params=None):
+        name = params.get("name")
+        matches = cmds.ls(name)
+        if not matches:
+            raise ValueError(f"Object not found: {name}")
+        obj = matches[0]
+
+        cmds.delete(obj)
+        return {"name": obj}
         
 
+    def _register_scene_callbacks(self):
+        """
+        Invalidate the cached scene name and materials count whenever they may have changed
+        """
+        for message in (om.MSceneMessage.kAfterNew, om.MSceneMessage.kAfterOpen,
+                        om.MSceneMessage.kAfterImport, om.MSceneMessage.kAfterSave):
+            self._callback_ids.append(om.MSceneMessage.addCallback(message, self._invalidate_scene_cache))
+        # Plugin shaders such as aiStandardSurface aren't shadingDependNodes, so watch every
+        # node and filter on the classification cmds.ls(materials=True) goes by
+        self._callback_ids.append(
+            om.MDGMessage.addNodeAddedCallback(self._on_node_changed, "dependNode"))
+        self._callback_ids.append(
+            om.MDGMessage.addNodeRemovedCallback(self._on_node_changed, "dependNode"))
+
+    def _on_node_changed(self, node, *args):
+        if self._scene_cache is None:
+            return
+        type_name = om.MFnDependencyNode(node).typeName
+        if "shader/" in om.MFnDependencyNode.classification(type_name):
+            self._scene_cache = None
+
+    def _invalidate_scene_cache(self, *args):
+        self._scene_cache = None
+
     def get_scene_info(self, params=None):
         """Get information about the current Maya scene"""
         try:
-            print("Getting scene info...")
+            # Scene name and materials count only change on the callbacks above
+            if self._scene_cache is None:
+                self._scene_cache = {
+                    "name": cmds.file(q=True, sn=True, shn=True) or "untitled",
+                    "materials_count": len(cmds.ls(materials=True)),
+                }
+
+            # One bulk call for the count; cmds.ls lists instanced transforms once
+            object_count = len(cmds.ls(transforms=True))
 
-            # Get the scene name from the current file
-            scene_name = cmds.file(q=True, sn=True, shn=True) or "untitled"
+            # Read the first MAX_SCENE_OBJECTS transforms with the API iterator instead of
+            # a cmds call per object, and stop walking the DAG once enough are collected
+            names = []
+            types = []
+            positions = []
+            it = om.MItDag(om.MItDag.kDepthFirst, om.MFn.kTransform)
+            while not it.isDone() and len(names) < MAX_SCENE_OBJECTS:
+                path = it.getPath()
+                # Skip repeat paths to instanced transforms
+                if path.instanceNumber() == 0:
+                    fn = om.MFnTransform(path)
+                    position = fn.translation(om.MSpace.kWorld)
+                    names.append(path.partialPathName())
+                    types.append(fn.typeName)
+                    positions.append((position.x, position.y, position.z))
+                it.next()
 
-            # Get all objects in the scene
-            all_objects = cmds.ls(transforms=True)
-            object_count = len(all_objects)
+            # Round all locations in one pass
+            objects = [
+                {"name": name, "type": obj_type, "location": location}
+                for name, obj_type, location in zip(names, types, _round_locations(positions))
+            ]
 
             scene_info = {
-                "name": scene_name,
+                "name": self._scene_cache["name"],
                 "object_count": object_count,
-                "objects": [],
-                "materials_count": len(cmds.ls(materials=True)),
+                "objects": objects,
+                "materials_count": self._scene_cache["materials_count"],
             }
 
-            # Limit to first 10 objects
-            for i, obj in enumerate(all_objects):
-                if i >= 10:
-                    break
-
-                # Get object translation
-                position = cmds.xform(obj, q=True, ws=True, t=True)
-
-                obj_info = {
-                    "name": obj,
-                    "type": cmds.nodeType(obj),
-                    "location": [round(position[0], 2),
-                                round(position[1], 2),
-                                round(position[2], 2)],
-                }
-                scene_info["objects"].append(obj_info)
-
-            print(f"Scene info collected: {len(scene_info['objects'])} objects")
+            logger.debug("Scene info collected: %d objects", len(objects))
             return scene_info
 
         except Exception as e:
-            print(f"Error in get_scene_info: {str(e)}")
-            traceback.print_exc()
+            logger.exception("Error in get_scene_info: %s", e)
             return {"error": str(e)}
 
 
@@ -297,7 +510,7 @@ def maya_mcp_start_server():
         maya_mcp_server = MayaMCPServer()
         maya_mcp_server.start()
     else:
-        print("Server is already running")
+        logger.warning("Server is already running")
         maya_mcp_stop_server()
         maya_mcp_server = MayaMCPServer()
         maya_mcp_server.start()
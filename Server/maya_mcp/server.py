@@ -1,31 +1,69 @@
 from mcp.server.fastmcp import FastMCP, Context, Image
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 
 import logging
+import queue
 import socket
+import struct
+import sys
+import sysconfig
 from typing import Dict, Any, List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import json
-logging.basicConfig(level=logging.INFO, 
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+logging.basicConfig(level=logging.WARNING, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("MayaMCPServer")
 
+# Largest response frame accepted from Maya
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+def _json_dumps(obj):
+    """Serialize obj to UTF-8 encoded JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def _json_loads(data):
+    """Deserialize UTF-8 encoded JSON from a bytes-like object"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(str(data, 'utf-8'))
+
+def _recv_exact(sock, size, buf):
+    """Fill the first size bytes of buf from sock and return a view of them"""
+    view = memoryview(buf)[:size]
+    offset = 0
+    while offset < size:
+        n = sock.recv_into(view[offset:])
+        if not n:
+            raise ConnectionError("Connection closed before receiving full response")
+        offset += n
+    return view
+
 @asynccontextmanager
 async def server_lifespan(server: FastMCP):
     try:
         logger.info("Server is starting...")
         try:
-            maya = get_maya_connection()
+            # Open the first connection up front so a missing Maya fails fast
+            with maya_connection():
+                pass
         except Exception as e:
-            logger.error(f"Failed to connect to Maya: {e}")
+            logger.error("Failed to connect to Maya: %s", e)
             raise e
         yield {}
     finally:
-        global _maya_connection
-        if _maya_connection:
-            logger.info("Disconnecting from Maya on shutdown")
-            _maya_connection.disconnect()
-            _maya_connect = None
+        logger.info("Disconnecting from Maya on shutdown")
+        while True:
+            try:
+                _maya_connections.get_nowait().disconnect()
+            except queue.Empty:
+                break
         logger.info("Maya Server is shutting down...")
 
 # Create a FastMCP server
@@ -40,6 +78,7 @@ class MayaConnection:
     host: str
     port: int
     sock: socket.socket = None
+    _recv_buf: bytearray = field(default_factory=lambda: bytearray(65536), init=False, repr=False)
 
     def connect(self):
         if self.sock:
@@ -48,10 +87,13 @@ class MayaConnection:
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.connect((self.host, self.port))
-            logger.info(f"Connected to Maya at {self.host}:{self.port}")
+            # Commands are small, send them immediately instead of waiting on Nagle's algorithm
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            logger.info("Connected to Maya at %s:%s", self.host, self.port)
             return True
         except Exception as e:
-            logger.error(f"Failed to connect to Maya: {e}")
+            logger.error("Failed to connect to Maya: %s", e)
             self.sock = None
             return False
         
@@ -60,66 +102,80 @@ class MayaConnection:
             try:
                 self.sock.close()
             except Exception as e:
-                logger.error(f"Failed to disconnect from Maya: {e}")
+                logger.error("Failed to disconnect from Maya: %s", e)
             finally:
                 self.sock = None
                 logger.info("Disconnected from Maya")
 
-    def receive_full_response(self, sock, buffer_size=8192):
-        """Receive the complete response, potentially in multiple chunks"""
-        chunks = []
+    def is_alive(self):
+        """
+        Check without blocking that an idle connection hasn't been closed by Maya
+        """
+        if not self.sock:
+            return False
+        try:
+            self.sock.setblocking(False)
+            # An idle connection has nothing to read; EOF or stray bytes both mean it can't be reused
+            self.sock.recv(1, socket.MSG_PEEK)
+            return False
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+        finally:
+            try:
+                self.sock.settimeout(15.0)
+            except OSError:
+                pass
+
+    def _send_frame(self, sock, payload):
+        """Send payload behind its 4-byte length header without concatenating the two"""
+        header = struct.pack(">I", len(payload))
+        if not hasattr(sock, "sendmsg"):
+            # No sendmsg on Windows, build a single frame instead
+            frame = bytearray(header)
+            frame.extend(payload)
+            sock.sendall(frame)
+            return
+
+        buffers = [memoryview(header), memoryview(payload)]
+        while buffers:
+            sent = sock.sendmsg(buffers)
+            # Drop what the kernel took and retry with the remainder
+            while buffers and sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            if sent:
+                buffers[0] = buffers[0][sent:]
+
+    def receive_full_response(self, sock):
+        """
+        Receive a complete length-prefixed response.
+        The returned memoryview points into the connection's buffer and is only valid until the next receive.
+        """
         # Use a consistent timeout value that matches the addon's timeout
         sock.settimeout(15.0)  # Match the addon's timeout
 
         try:
-            while True:
-                try:
-                    chunk = sock.recv(buffer_size)
-                    if not chunk:
-                        # If we get an empty chunk, the connection might be closed
-                        if not chunks:  # If we haven't received anything yet, this is an error
-                            raise Exception("Connection closed before receiving any data")
-                        break
-                    
-                    chunks.append(chunk)
-                    
-                    # Check if we've received a complete JSON object
-                    try:
-                        data = b''.join(chunks)
-                        json.loads(data.decode('utf-8'))
-                        # If we get here, it parsed successfully
-                        logger.info(f"Received complete response ({len(data)} bytes)")
-                        return data
-                    except json.JSONDecodeError:
-                        # Incomplete JSON, continue receiving
-                        continue
-                except socket.timeout:
-                    # If we hit a timeout during receiving, break the loop and try to use what we have
-                    logger.warning("Socket timeout during chunked receive")
-                    break
-                except (ConnectionError, BrokenPipeError, ConnectionResetError) as e:
-                    logger.error(f"Socket connection error during receive: {str(e)}")
-                    raise  # Re-raise to be handled by the caller
+            # The header says exactly how much to read, so there's nothing to parse until the end
+            length = struct.unpack(">I", _recv_exact(sock, 4, self._recv_buf))[0]
+            if length > MAX_FRAME_SIZE:
+                # Most likely a desynced stream; send_command drops the connection on this
+                raise ConnectionError(f"Response frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+            if length > len(self._recv_buf):
+                self._recv_buf = bytearray(length)
+            data = _recv_exact(sock, length, self._recv_buf)
+            logger.debug("Received complete response (%d bytes)", length)
+            return data
         except socket.timeout:
-            logger.warning("Socket timeout during chunked receive")
+            logger.warning("Socket timeout during receive")
+            raise Exception("Timed out waiting for response from Maya")
+        except (ConnectionError, BrokenPipeError, ConnectionResetError) as e:
+            logger.error("Socket connection error during receive: %s", e)
+            raise  # Re-raise to be handled by the caller
         except Exception as e:
-            logger.error(f"Error during receive: {str(e)}")
+            logger.error("Error during receive: %s", e)
             raise
-            
-        # If we get here, we either timed out or broke out of the loop
-        # Try to use what we have
-        if chunks:
-            data = b''.join(chunks)
-            logger.info(f"Returning data after receive completion ({len(data)} bytes)")
-            try:
-                # Try to parse what we have
-                json.loads(data.decode('utf-8'))
-                return data
-            except json.JSONDecodeError:
-                # If we can't parse it, it's incomplete
-                raise Exception("Incomplete JSON response received")
-        else:
-            raise Exception("No data received")
 
     def send_command(self, command_type: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -134,75 +190,84 @@ class MayaConnection:
         }
         
         try:
-            logger.info(f"Sending command: {command_type} with params: {params}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Sending command: %s with params: %r", command_type, params)
             
-            self.sock.sendall(json.dumps(command).encode("utf-8"))
-            logger.info(f"Command sent to Maya")
+            self._send_frame(self.sock, _json_dumps(command))
 
             self.sock.settimeout(15.0)
 
             response_data = self.receive_full_response(self.sock)
-            logger.info(f"Received response from Maya")
 
-            response = json.loads(response_data.decode('utf-8'))
-            logger.info(f"Response parsed, status: {response.get('status', 'unknown')}")
-            
-            if response.get("status") == "error":
-                logger.error(f"Maya error: {response.get('message')}")
-                raise Exception(response.get("message", "Unknown error from Maya"))
-            
-            return response.get("result", {})
+            response = _json_loads(response_data)
+            logger.debug("Response parsed, status: %s", response.get('status', 'unknown'))
         except Exception as e:
-            logger.error(f"Failed to send command to Maya: {e}")
-            self.sock = None
+            logger.error("Failed to send command to Maya: %s", e)
+            # The stream is out of sync now, so this connection can't be reused
+            self.disconnect()
             raise e
 
-# Global connection for resources
-_maya_connection = None            
+        if response.get("status") == "error":
+            logger.error("Maya error: %s", response.get('message'))
+            raise Exception(response.get("message", "Unknown error from Maya"))
+
+        return response.get("result", {})
+
+# Idle connections shared by tool calls, most recently used first
+_maya_connections = queue.LifoQueue()
 
 def get_maya_connection():
     """
-    Get or create a persistent Maya connection
+    Take an idle Maya connection from the pool, or open a new one
     """
-    global _maya_connection
-
-    if _maya_connection is not None:
+    while True:
         try:
-            # First check if the connection is still valid
-            result = _maya_connection.send_command("about")
-            return result.get("enabled", False)
-        except Exception as e:
-            logger.error(f"Maya connection is invalid: {e}")
-            try:
-                _maya_connection.disconnect()
-            except:
-                pass
-            _maya_connection = None
-    
-    if _maya_connection is None:
-        _maya_connection = MayaConnection(host="localhost", port=9876)
-        if not _maya_connection.connect():
-            logger.error("Failed to connect to Maya")
-            _maya_connection = None
-            raise Exception("Failed to connect to Maya")
-    
-    return _maya_connection
-    # Create a new connection
-    _maya_connection = MayaConnection()
-    return _maya_connection
+            connection = _maya_connections.get_nowait()
+        except queue.Empty:
+            break
+        if connection.is_alive():
+            return connection
+        # Maya was restarted or dropped the socket while it sat in the pool
+        logger.info("Dropping stale Maya connection")
+        connection.disconnect()
+
+    connection = MayaConnection(host="localhost", port=9876)
+    if not connection.connect():
+        logger.error("Failed to connect to Maya")
+        raise Exception("Failed to connect to Maya")
+    return connection
+
+def release_maya_connection(connection: MayaConnection):
+    """
+    Return a connection to the pool, dropping it if a socket error invalidated it
+    """
+    if connection.sock is None:
+        return
+    _maya_connections.put(connection)
+
+@contextmanager
+def maya_connection():
+    """
+    Borrow a pooled Maya connection for the duration of the block
+    """
+    connection = get_maya_connection()
+    try:
+        yield connection
+    finally:
+        release_maya_connection(connection)
 
 
 @mcp.tool()
 def get_maya_version(ctx: Context) -> str:
     """Get the version of Maya"""
-    maya = get_maya_connection()
-    return maya.send_command("about")
+    with maya_connection() as maya:
+        return maya.send_command("about")
 
 @mcp.tool()
 def get_scene_info(ctx: Context) -> str:
     """Get the current scene name"""
-    maya = get_maya_connection()
-    return maya.send_command("get_scene_info")
+    with maya_connection() as maya:
+        return maya.send_command("get_scene_info")
 
 @mcp.tool()
 def modify_object(
@@ -219,14 +284,11 @@ def modify_object(
     Parameters:
     - name: Name of the object to modify
     - location: Optional [x, y, z] location coordinates
-    - rotation: Optional [x, y, z] rotation in radians
+    - rotation: Optional [x, y, z] rotation in degrees
     - scale: Optional [x, y, z] scale factors
     - visible: Optional boolean to set visibility
     """
     try:
-        # Get the global connection
-        maya = get_maya_connection()
-        
         params = {"name": name}
         
         if location is not None:
@@ -236,12 +298,13 @@ def modify_object(
         if scale is not None:
             params["scale"] = scale
         if visible is not None:
-            params["visible"] = visible
+            params["visibility"] = visible
             
-        result = maya.send_command("modify_object", params)
+        with maya_connection() as maya:
+            result = maya.send_command("modify_object", params)
         return f"Modified object: {result['name']}"
     except Exception as e:
-        logger.error(f"Error modifying object: {str(e)}")
+        logger.error("Error modifying object: %s", e)
         return f"Error modifying object: {str(e)}"
 
 @mcp.tool()
@@ -253,44 +316,33 @@ def create_object(
     rotation: list[float] = None,
     scale: list[float] = None,
     # Torus-specific parameters
-    align: str = "WORLD",
     major_segments: int = 48,
     minor_segments: int = 12,
-    mode: str = "MAJOR_MINOR",
     major_radius: float = 1.0,
-    minor_radius: float = 0.25,
-    abso_major_rad: float = 1.25,
-    abso_minor_rad: float = 0.75,
-    generate_uvs: bool = True
+    minor_radius: float = 0.25
 ) -> str:
     """
     Create a new object in the Maya scene.
     
     Parameters:
-    - type: Object type (CUBE, SPHERE, CYLINDER, PLANE, CONE, TORUS, EMPTY, CAMERA, LIGHT)
+    - type: Object type (CUBE, SPHERE, CYLINDER, PLANE, CONE, TORUS)
     - name: Optional name for the object
     - location: Optional [x, y, z] location coordinates
-    - rotation: Optional [x, y, z] rotation in radians
-    - scale: Optional [x, y, z] scale factors (not used for TORUS)
+    - rotation: Optional [x, y, z] rotation in degrees
+    - scale: Optional [x, y, z] scale factors
     
-    Torus-specific parameters (only used when type == "TORUS"):
-    - align: How to align the torus ('WORLD', 'VIEW', or 'CURSOR')
+    Torus-specific parameters (only used when type is TORUS):
     - major_segments: Number of segments for the main ring
     - minor_segments: Number of segments for the cross-section
-    - mode: Dimension mode ('MAJOR_MINOR' or 'EXT_INT')
     - major_radius: Radius from the origin to the center of the cross sections
     - minor_radius: Radius of the torus' cross section
-    - abso_major_rad: Total exterior radius of the torus
-    - abso_minor_rad: Total interior radius of the torus
-    - generate_uvs: Whether to generate a default UV map
     
     Returns:
     A message indicating the created object name.
     """
     try:
-        # Get the global connection
-        maya = get_maya_connection()
-        
+        type = type.upper()
+
         # Set default values for missing parameters
         loc = location or [0, 0, 0]
         rot = rotation or [0, 0, 0]
@@ -305,13 +357,18 @@ def create_object(
         
         if name:
             params["name"] = name
+        if type == "TORUS":
+            params["major_segments"] = major_segments
+            params["minor_segments"] = minor_segments
+            params["major_radius"] = major_radius
+            params["minor_radius"] = minor_radius
 
-        params["scale"] = sc
-        result = maya.send_command("create_object", params)
+        with maya_connection() as maya:
+            result = maya.send_command("create_object", params)
         return f"Created {type} object: {result['name']}"
 
     except Exception as e:
-        logger.error(f"Error creating object: {str(e)}")
+        logger.error("Error creating object: %s", e)
         return f"Error creating object: {str(e)}"
     
 @mcp.prompt()
@@ -353,6 +410,10 @@ def greeting(name: str) -> str:
     return f"Hello 123, {name}!"
 
 def main():
+    # On free-threaded builds (python3.13t) the GIL can be re-enabled at import time
+    # by an extension module that doesn't declare support for running without it
+    if sysconfig.get_config_var("Py_GIL_DISABLED") and sys._is_gil_enabled():
+        logger.warning("Free-threaded Python build is running with the GIL re-enabled")
     mcp.run()
 
 # if __name__ == "__main__":